@@ -1,8 +1,11 @@
-﻿import os, json, sys, time, re
-from typing import List, Optional, Tuple, Dict
+﻿import os, json, sys, time, re, functools, atexit, threading, asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple, Dict, AsyncIterator
 from dateutil.parser import parse as parse_date
-import requests
-from pydantic import BaseModel, Field, field_validator
+import httpx
+from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
 
 # =========================
 #  Configuración (por ENV)
@@ -17,6 +20,19 @@ OPENAI_MODEL     = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 # Cambiá a False para crear issues reales
 DEFAULT_DRY_RUN  = True if os.getenv("JIRA_DRY_RUN", "1") != "0" else False
 
+# Cantidad de requests en vuelo en paralelo contra la API de Jira
+JIRA_MAX_WORKERS = int(os.getenv("JIRA_MAX_WORKERS", "5"))
+# Tope de POSTs por segundo (Jira Cloud corta ~10 rps por IP)
+JIRA_MAX_RPS     = int(os.getenv("JIRA_MAX_RPS", "8"))
+# Máximo de issues por llamada a /issue/bulk (límite de Jira Cloud)
+BULK_CHUNK_SIZE  = 50
+
+# Presupuesto de tokens del LLM: entrada (el brief se recorta conservando inicio y final; 0 = sin recorte) y salida
+LLM_INPUT_TOKENS     = int(os.getenv("JIRA_LLM_INPUT_TOKENS", "6000"))
+LLM_OUTPUT_TOKENS    = int(os.getenv("JIRA_LLM_OUTPUT_TOKENS", "8192"))
+# Tope de salida para el reintento cuando la respuesta del LLM viene truncada
+LLM_RETRY_MAX_TOKENS = 16384
+
 # =========================
 #  Modelos (entrada LLM)
 # =========================
@@ -53,33 +69,235 @@ class TaskIn(BaseModel):
         except Exception:
             return None
 
-class TaskBundle(BaseModel):
-    tasks: List[TaskIn]
+# Esquema que se le pasa a OpenAI (structured outputs estricto): todos los campos son
+# obligatorios y sin defaults; los defaults de TaskIn se aplican después de parsear.
+class SubtaskLLM(BaseModel):
+    title: str
+    description: Optional[str]
+    due_date: Optional[str]
+    assignee: Optional[str]
+
+class TaskLLM(BaseModel):
+    title: str
+    description: Optional[str]
+    labels: List[str]
+    priority: Optional[str]
+    due_date: Optional[str]
+    assignee: Optional[str]
+    subtasks: List[SubtaskLLM]
+
+class TaskBundleLLM(BaseModel):
+    tasks: List[TaskLLM]
+
+# Validador armado una sola vez para las tandas de tareas que llegan por stream
+_TASKS_ADAPTER = TypeAdapter(List[TaskIn])
+
+def _apply_llm_defaults(t):
+    """El LLM devuelve null en vez de omitir: la prioridad vacía vuelve a ser "Medium"."""
+    if isinstance(t, dict) and not t.get("priority"):
+        t = {**t, "priority": "Medium"}
+    return t
+
+def _repair_task(t):
+    """Corrige desvíos comunes del LLM (listas nulas, string suelto en vez de lista, subtarea como texto)."""
+    if not isinstance(t, dict):
+        return t
+    t = dict(t)
+    for key in ("labels", "subtasks"):
+        v = t.get(key)
+        if isinstance(v, (str, dict)):
+            t[key] = [v]
+        elif not isinstance(v, list):
+            # null, números, booleanos, etc.: no hay nada rescatable
+            t[key] = []
+    t["subtasks"] = [{"title": st} if isinstance(st, str) else st for st in t["subtasks"]]
+    return t
+
+def validate_tasks(raw: list) -> List[TaskIn]:
+    """Valida tareas crudas del LLM; si fallan, intenta una reparación antes de rendirse."""
+    raw = [_apply_llm_defaults(t) for t in raw]
+    try:
+        return _TASKS_ADAPTER.validate_python(raw)
+    except ValidationError:
+        return _TASKS_ADAPTER.validate_python([_repair_task(t) for t in raw])
 
 # =========================
 #  HTTP helpers
 # =========================
-def jira_headers() -> Dict[str, str]:
-    return {"Accept": "application/json", "Content-Type": "application/json"}
+_HEADERS: Dict[str, str] = {"Accept": "application/json", "Content-Type": "application/json"}
+_AUTH: Tuple[str, str] = (JIRA_EMAIL, JIRA_API_TOKEN)
+
+_CLIENT_KWARGS = dict(
+    auth=_AUTH,
+    headers=_HEADERS,
+    http2=True,
+    timeout=httpx.Timeout(30.0),
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+)
+
+# Cliente compartido: reutiliza conexiones TCP/TLS (keep-alive + HTTP/2) entre llamadas y threads
+_CLIENT = httpx.Client(**_CLIENT_KWARGS)
+atexit.register(_CLIENT.close)
+
+def new_async_client() -> httpx.AsyncClient:
+    """Cliente async con la misma config; queda atado al event loop que lo usa (uno por corrida)."""
+    return httpx.AsyncClient(**_CLIENT_KWARGS)
+
+def http_get(url: str, params: Optional[dict] = None):
+    r = _CLIENT.get(url, params=params)
+    if r.status_code >= 400:
+        raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text}")
+    return r.json()
 
-def jira_auth() -> Tuple[str, str]:
-    return (JIRA_EMAIL, JIRA_API_TOKEN)
+class JiraHTTPError(RuntimeError):
+    """Error HTTP de Jira; guarda el status y el cuerpo para quien necesite inspeccionarlos."""
+    def __init__(self, message: str, status_code: int, text: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.text = text
+
+class RateLimitError(RuntimeError):
+    """Jira respondió 429/503; `retry_after` trae los segundos sugeridos si vinieron en el header."""
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class _RateLimiter:
+    """Ventana deslizante thread-safe: como mucho `calls` llamadas cada `period` segundos."""
+    def __init__(self, calls: int, period: float = 1.0):
+        self.calls = calls
+        self.period = period
+        self._stamps = deque()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> Optional[float]:
+        """Toma un lugar en la ventana (None) o devuelve cuánto esperar antes de reintentar."""
+        with self._lock:
+            now = time.monotonic()
+            while self._stamps and now - self._stamps[0] >= self.period:
+                self._stamps.popleft()
+            if len(self._stamps) < self.calls:
+                self._stamps.append(now)
+                return None
+            return self.period - (now - self._stamps[0])
+
+    def acquire(self):
+        while (delay := self._reserve()) is not None:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        while (delay := self._reserve()) is not None:
+            await asyncio.sleep(delay)
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
 
-def http_get(url: str):
-    r = requests.get(url, headers=jira_headers(), auth=jira_auth())
+class _Pacer:
+    """
+    Frena a todos los workers sólo cuando Jira avisa back-pressure en los headers:
+    Retry-After pausa a todos ese tiempo; X-RateLimit-Remaining bajo (o NearLimit) abre una
+    ventana de `window` segundos en la que cada POST reserva su propio turno, espaciados a 1/rps.
+    """
+    def __init__(self, rps: int, low_remaining: int = 5, window: float = 1.0):
+        self.interval = 1.0 / rps
+        self.low_remaining = low_remaining
+        self.window = window
+        self._next_slot = 0.0
+        self._spaced_until = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, headers: httpx.Headers):
+        now = time.monotonic()
+        retry_after = _parse_retry_after(headers.get("Retry-After"))
+        remaining = headers.get("X-RateLimit-Remaining", "")
+        near = headers.get("X-RateLimit-NearLimit", "").lower() == "true"
+        with self._lock:
+            if retry_after:
+                self._next_slot = max(self._next_slot, now + retry_after)
+            elif near or (remaining.isdigit() and int(remaining) < self.low_remaining):
+                self._spaced_until = max(self._spaced_until, now + self.window)
+
+    def _reserve(self) -> float:
+        """Devuelve cuánto esperar; en modo espaciado además corre el próximo turno un intervalo."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._spaced_until:
+                slot = max(self._next_slot, now)
+                self._next_slot = slot + self.interval
+                return slot - now
+            return max(0.0, self._next_slot - now)
+
+    def wait(self):
+        if (delay := self._reserve()):
+            time.sleep(delay)
+
+    async def wait_async(self):
+        if (delay := self._reserve()):
+            await asyncio.sleep(delay)
+
+_POST_LIMITER = _RateLimiter(JIRA_MAX_RPS, 1.0)
+_PACER = _Pacer(JIRA_MAX_RPS)
+_BACKOFF = wait_exponential(min=1, max=30)
+
+def _wait_rate_limit(retry_state) -> float:
+    # Si Jira manda Retry-After lo respetamos; si no, backoff exponencial
+    exc = retry_state.outcome.exception()
+    retry_after = getattr(exc, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    return _BACKOFF(retry_state)
+
+@retry(stop=stop_after_attempt(5), wait=_wait_rate_limit, retry=retry_if_exception_type(RateLimitError), reraise=True)
+def _post_with_retry(url: str, payload: dict):
+    _PACER.wait()
+    _POST_LIMITER.acquire()
+    r = _CLIENT.post(url, json=payload)
+    _PACER.observe(r.headers)
+    if r.status_code in (429, 503):
+        raise RateLimitError(
+            f"POST {url} -> {r.status_code}: {r.text}",
+            retry_after=_parse_retry_after(r.headers.get("Retry-After")),
+        )
     if r.status_code >= 400:
-        raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text}")
+        raise JiraHTTPError(f"POST {url} -> {r.status_code}: {r.text}", r.status_code, r.text)
     return r.json()
 
 def http_post(url: str, payload: dict):
-    r = requests.post(url, headers=jira_headers(), auth=jira_auth(), data=json.dumps(payload))
+    return _post_with_retry(url, payload)
+
+async def http_get_async(client: httpx.AsyncClient, sem: asyncio.Semaphore, url: str, params: Optional[dict] = None):
+    async with sem:
+        r = await client.get(url, params=params)
+    if r.status_code >= 400:
+        raise RuntimeError(f"GET {url} -> {r.status_code}: {r.text}")
+    return r.json()
+
+@retry(stop=stop_after_attempt(5), wait=_wait_rate_limit, retry=retry_if_exception_type(RateLimitError), reraise=True)
+async def http_post_async(client: httpx.AsyncClient, sem: asyncio.Semaphore, url: str, payload: dict):
+    async with sem:
+        # Pacer y limiter dentro del semáforo: el turno se toma justo antes de enviar,
+        # así los que esperaban el semáforo no salen en ráfaga con timestamps viejos
+        await _PACER.wait_async()
+        await _POST_LIMITER.acquire_async()
+        r = await client.post(url, json=payload)
+    _PACER.observe(r.headers)
+    if r.status_code in (429, 503):
+        raise RateLimitError(
+            f"POST {url} -> {r.status_code}: {r.text}",
+            retry_after=_parse_retry_after(r.headers.get("Retry-After")),
+        )
     if r.status_code >= 400:
-        raise RuntimeError(f"POST {url} -> {r.status_code}: {r.text}")
+        raise JiraHTTPError(f"POST {url} -> {r.status_code}: {r.text}", r.status_code, r.text)
     return r.json()
 
 # =========================
 #  Jira metadata helpers
 # =========================
+# La metadata del sitio/proyecto no cambia durante una corrida: se cachea por proceso.
+@functools.lru_cache(maxsize=None)
 def get_priority_map() -> Dict[str, str]:
     out = {}
     for p in http_get(f"{JIRA_BASE_URL}/rest/api/3/priority"):
@@ -90,8 +308,12 @@ def get_priority_map() -> Dict[str, str]:
     out.update(alias)
     return out
 
+@functools.lru_cache(maxsize=None)
 def get_issue_type_ids(project_key: str) -> Dict[str, str]:
-    data = http_get(f"{JIRA_BASE_URL}/rest/api/3/issue/createmeta?projectKeys={project_key}&expand=projects.issuetypes.fields")
+    data = http_get(
+        f"{JIRA_BASE_URL}/rest/api/3/issue/createmeta",
+        params={"projectKeys": project_key, "expand": "projects.issuetypes.fields"},
+    )
     its = data["projects"][0]["issuetypes"]
     out = {}
     wanted = {
@@ -112,15 +334,20 @@ def get_issue_type_ids(project_key: str) -> Dict[str, str]:
     return out
 
 
-def find_account_id(query: Optional[str]) -> Optional[str]:
-    """Busca el accountId por nombre o email."""
+# accountId de Jira Cloud (ej: 557058:f58131cb-b67d-43c7-b30d-6b58d40bd077): no hace falta buscarlo
+_ACCTID_RE = re.compile(r"^\d+:[a-f0-9-]+$", re.I)
+
+async def find_account_id_async(client: httpx.AsyncClient, sem: asyncio.Semaphore, query: Optional[str]) -> Optional[str]:
+    """Busca el accountId por nombre o email (si ya es un accountId, lo devuelve tal cual)."""
     if not query:
         return None
-    url = f"{JIRA_BASE_URL}/rest/api/3/user/search?query={requests.utils.quote(query)}"
-    users = http_get(url)
+    if _ACCTID_RE.match(query):
+        return query
+    users = await http_get_async(client, sem, f"{JIRA_BASE_URL}/rest/api/3/user/search", params={"query": query})
     return users[0]["accountId"] if users else None
 
 
+@functools.lru_cache(maxsize=None)
 def get_epic_link_field_key() -> Optional[str]:
     """
     Busca el fieldKey del campo 'Epic Link' (company-managed).
@@ -133,14 +360,35 @@ def get_epic_link_field_key() -> Optional[str]:
             return f.get("id")  # ej: customfield_10014
     return None
 
+def _jql_escape(value: str) -> str:
+    """Escapa un valor para usarlo dentro de un string JQL entre comillas dobles."""
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
 def find_epic_issue(project_key: str, epic_name: str) -> Optional[Dict[str, str]]:
     """
     Devuelve {'key': 'CS-1', 'id': '10001', 'summary': 'El Gran Bazar Chino'} si existe.
     """
-    jql = f'project="{project_key}" AND issuetype=Epic AND summary~"{epic_name}" ORDER BY created DESC'
-    payload = {"jql": jql, "maxResults": 10, "fields": ["summary"]}
-    res = http_post(f"{JIRA_BASE_URL}/rest/api/3/search", payload)
-    issues = res.get("issues", [])
+    url = f"{JIRA_BASE_URL}/rest/api/3/search/jql"
+    base = f'project="{_jql_escape(project_key)}" AND issuetype=Epic'
+    name = _jql_escape(epic_name)
+    # summary no admite "=": la búsqueda por frase exacta trae 1 resultado y se confirma acá.
+    # La frase va entre comillas dentro del string JQL, así que el nombre se escapa dos veces.
+    phrase = _jql_escape(f'"{_jql_escape(epic_name)}"')
+    jql = f'{base} AND summary ~ "{phrase}" ORDER BY created DESC'
+    try:
+        issues = http_post(url, {"jql": jql, "maxResults": 1, "fields": ["summary"]}).get("issues", [])
+    except JiraHTTPError as e:
+        # Si Jira no acepta la frase (400), seguimos con la búsqueda difusa
+        if e.status_code != 400:
+            raise
+        issues = []
+    if issues and issues[0]["fields"].get("summary", "").strip().lower() == epic_name.strip().lower():
+        it = issues[0]
+        return {"key": it["key"], "id": it["id"], "summary": it["fields"]["summary"]}
+
+    # Sin match exacto: búsqueda difusa como antes
+    jql = f'{base} AND summary ~ "{name}" ORDER BY created DESC'
+    issues = http_post(url, {"jql": jql, "maxResults": 10, "fields": ["summary"]}).get("issues", [])
     if not issues:
         return None
     # Prefer exact match de summary
@@ -154,35 +402,71 @@ def find_epic_issue(project_key: str, epic_name: str) -> Optional[Dict[str, str]
 # =========================
 #  ADF
 # =========================
+_EMPTY_ADF = {"type":"doc","version":1,"content":[{"type":"paragraph","content":[{"type":"text","text":""}]}]}
+
 def to_adf_description(title: str, description: str, labels: List[str], due_date: Optional[str], assignee: Optional[str]) -> dict:
-    content = []
-    if description:
-        content.append({"type":"paragraph","content":[{"type":"text","text":description}]})
-    meta_items = []
-    if labels:
-        meta_items.append(f"Etiquetas: {', '.join(labels)}")
-    if due_date:
-        meta_items.append(f"Vence: {due_date}")
-    if assignee:
-        meta_items.append(f"Asignado: {assignee}")
-    if meta_items:
-        content.append({"type":"paragraph","content":[{"type":"text","text":" · ".join(meta_items)}]})
-    if not content:
-        content = [{"type":"paragraph","content":[{"type":"text","text":""}]}]
+    if not (description or labels or due_date or assignee):
+        return _EMPTY_ADF
+    meta = " · ".join(filter(None, [
+        f"Etiquetas: {', '.join(labels)}" if labels else "",
+        f"Vence: {due_date}" if due_date else "",
+        f"Asignado: {assignee}" if assignee else "",
+    ]))
+    content = [
+        {"type":"paragraph","content":[{"type":"text","text":text}]}
+        for text in (description, meta) if text
+    ]
     return {"type":"doc","version":1,"content":content}
 
 # =========================
 #  LLM: estructurar texto
 # =========================
-def llm_structurize_tasks(free_text: str) -> TaskBundle:
-    import os, json
-    from openai import OpenAI
+def _load_encoding(model: str):
+    # tiktoken baja el BPE de internet la primera vez: sin red (o sin tiktoken) devolvemos None
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def truncate_to_tokens(text: str, model: str, max_tokens: int = LLM_INPUT_TOKENS) -> str:
+    """
+    Si el texto supera `max_tokens`, conserva la primera y la última mitad del presupuesto.
+    `max_tokens <= 0` desactiva el recorte. Sin tokenizer disponible se recorta por caracteres (~4 por token).
+    """
+    # Un token nunca ocupa menos de un byte: si entran los bytes, entran los tokens
+    if max_tokens <= 0 or len(text.encode("utf-8")) <= max_tokens:
+        return text
+    half = max_tokens // 2
+    enc = _load_encoding(model)
+    if enc is None:
+        budget = max_tokens * 4
+        if len(text) <= budget:
+            return text
+        half = budget // 2
+        return text[:half] + text[-(budget - half):]
+    tokens = enc.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:half] + tokens[-(max_tokens - half):])
+
+async def aiter_tasks(free_text: str) -> AsyncIterator[TaskIn]:
+    """
+    Genera las tareas a medida que el LLM las va emitiendo (stream + parseo parcial del JSON del SDK),
+    así la creación en Jira puede arrancar antes de que termine la respuesta.
+    """
+    import os
+    from openai import AsyncOpenAI, LengthFinishReasonError
 
     api_key = os.getenv("OPENAI_API_KEY")
     model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY no está seteada en el entorno/secrets de Streamlit.")
-    client = OpenAI(api_key=api_key)
+    client = AsyncOpenAI(api_key=api_key)
+    free_text = truncate_to_tokens(free_text, model)
 
     system = (
         "Sos un asistente que convierte un texto desordenado en un plan de tareas para Jira. "
@@ -194,52 +478,95 @@ REQUISITOS POR TAREA: ... (tu prompt actual) ...
 TEXTO:
 \"\"\"{free_text}\"\"\""""
 
-    # 1) Intento Chat Completions
+    messages = [{"role":"system","content":system},{"role":"user","content":user}]
+    yielded = 0
+    snapshot = ""
+    # Structured outputs: OpenAI valida el esquema de TaskBundleLLM del lado del servidor
     try:
-        resp = client.chat.completions.create(
+        async with client.beta.chat.completions.stream(
             model=model,
-            messages=[{"role":"system","content":system},{"role":"user","content":user}],
+            messages=messages,
             temperature=0.1,
-            response_format={"type":"json_object"},
-        )
-        data = json.loads(resp.choices[0].message.content)
-        return TaskBundle(**data)
-
-    except Exception as e_chat:
-        # 2) Fallback a Responses API
+            response_format=TaskBundleLLM,
+            max_tokens=LLM_OUTPUT_TOKENS,
+        ) as stream:
+            async for event in stream:
+                if event.type != "content.delta":
+                    continue
+                snapshot = event.snapshot
+                # El SDK ya parsea el snapshot en forma parcial en cada delta: no se vuelve a parsear acá
+                doc = event.parsed
+                tasks = doc.get("tasks", []) if isinstance(doc, dict) else []
+                if not isinstance(tasks, list):
+                    continue
+                # La última tarea del snapshot puede estar a medias: sólo se emiten las que ya tienen sucesora
+                for t in validate_tasks(tasks[yielded:-1]):
+                    yield t
+                    yielded += 1
+            message = (await stream.get_final_completion()).choices[0].message
+    except ValidationError as e:
+        # JSON completo pero fuera de esquema: se repara localmente en vez de pedir otra respuesta
         try:
-            resp2 = client.responses.create(
-                model=model, input=f"{system}\n\n{user}",
-                temperature=0.1, response_format={"type":"json_object"}
-            )
-            content_text = getattr(resp2, "output_text", None)
-            if not content_text:
-                parts = []
-                for out in getattr(resp2, "output", []):
-                    for c in getattr(out, "content", []):
-                        if getattr(c, "type", "") == "output_text":
-                            parts.append(getattr(c, "text", ""))
-                content_text = "".join(parts)
-            data = json.loads(content_text)
-            return TaskBundle(**data)
-        except Exception as e_resp:
+            doc = json.loads(snapshot)
+            repaired = validate_tasks(doc.get("tasks", []) if isinstance(doc, dict) else [])
+        except ValueError:
+            raise RuntimeError(f"La respuesta de OpenAI no respeta el esquema de tareas: {e}")
+        for t in repaired[yielded:]:
+            yield t
+        return
+    except LengthFinishReasonError:
+        if yielded:
+            # Las tareas ya emitidas se terminan de crear y se reportan antes de que suba este error
             raise RuntimeError(
-                f"OpenAI falló (¿key/modelo?). ChatCompletions: {e_chat} | Responses: {e_resp}"
+                f"La respuesta de OpenAI se cortó después de {yielded} tareas (tope JIRA_LLM_OUTPUT_TOKENS={LLM_OUTPUT_TOKENS}); "
+                "las restantes no se crearon: subí el tope o partí el brief en partes más chicas."
             )
+        # Respuesta truncada sin nada emitido: un único reintento con más lugar para la salida
+        try:
+            message = (await client.beta.chat.completions.parse(
+                model=model,
+                messages=messages,
+                temperature=0.1,
+                response_format=TaskBundleLLM,
+                max_tokens=LLM_RETRY_MAX_TOKENS,
+            )).choices[0].message
+        except Exception as e:
+            raise RuntimeError(f"OpenAI falló (¿key/modelo?): {e}")
+    except Exception as e:
+        raise RuntimeError(f"OpenAI falló (¿key/modelo?): {e}")
+
+    if message.parsed is None:
+        raise RuntimeError(f"OpenAI no devolvió tareas: {message.refusal or 'respuesta vacía'}")
+    for t in validate_tasks([t.model_dump() for t in message.parsed.tasks[yielded:]]):
+        yield t
+
+_EPIC_RE = re.compile(r"^\s*epic\s*:\s*(.+)$", re.I | re.M)
 
 def detect_epic_name(text: str) -> Optional[str]:
-    m = re.search(r"(?im)^\s*epic\s*:\s*(.+)$", text)
-    if m:
-        return m.group(1).strip()
-    return None
+    m = _EPIC_RE.search(text)
+    return m.group(1).strip() if m else None
 
 # =========================
 #  Creación en Jira
 # =========================
-def create_issue(task: TaskIn, ids: Dict[str,str], epic_ctx: Optional[Dict[str,str]]=None, epic_field_key: Optional[str]=None, parent_key: Optional[str]=None) -> str:
-    priority_map = get_priority_map()
-    prio_id = priority_map.get((task.priority or "").lower()) if task.priority else None
-    assignee_id = find_account_id(task.assignee)
+@dataclass
+class RunContext:
+    """Estado que se resuelve una vez por corrida y comparten todas las issues."""
+    ids: Dict[str, str]
+    priority_map: Dict[str, str]
+    epic_ctx: Optional[Dict[str, str]] = None
+    epic_field_key: Optional[str] = None
+    assignee_cache: Dict[str, Optional[str]] = field(default_factory=dict)
+    # Búsquedas de accountId en vuelo: tareas concurrentes con el mismo responsable comparten una sola
+    assignee_lookups: Dict[str, "asyncio.Future[Optional[str]]"] = field(default_factory=dict)
+    client: Optional[httpx.AsyncClient] = None
+    sem: Optional[asyncio.Semaphore] = None
+    # Claves ya creadas (tareas por índice del brief y subtareas), para reportarlas aunque la corrida falle
+    created: Dict[int, str] = field(default_factory=dict)
+    created_subtasks: List[str] = field(default_factory=list)
+
+def build_issue_fields(task: TaskIn, ctx: RunContext, parent_key: Optional[str]=None) -> dict:
+    assignee_id = ctx.assignee_cache.get(task.assignee) if task.assignee else None
 
     fields = {
         "project": {"key": JIRA_PROJECT_KEY},
@@ -250,32 +577,120 @@ def create_issue(task: TaskIn, ids: Dict[str,str], epic_ctx: Optional[Dict[str,s
 
     if parent_key:
         # Subtarea
-        fields["issuetype"] = {"id": ids["subtask"]}
+        fields["issuetype"] = {"id": ctx.ids["subtask"]}
         fields["parent"] = {"key": parent_key}
     else:
-        # Tarea principal
-        fields["issuetype"] = {"id": ids["task"]}
-        if prio_id:
-            fields["priority"] = {"id": prio_id}
+        # Tarea principal (la prioridad solo aplica acá)
+        fields["issuetype"] = {"id": ctx.ids["task"]}
+        if task.priority:
+            prio_id = ctx.priority_map.get(task.priority.lower())
+            if prio_id:
+                fields["priority"] = {"id": prio_id}
         # Epic link (solo para tareas principales)
-        if epic_ctx:
-            if epic_field_key:
+        if ctx.epic_ctx:
+            if ctx.epic_field_key:
                 # Company-managed: Epic Link custom field
-                fields[epic_field_key] = epic_ctx["key"]
+                fields[ctx.epic_field_key] = ctx.epic_ctx["key"]
             else:
                 # Team-managed: usar parent = epic.id (si lo permite)
-                fields["parent"] = {"id": epic_ctx["id"]}
+                fields["parent"] = {"id": ctx.epic_ctx["id"]}
 
     if task.due_date:
         fields["duedate"] = task.due_date
     if assignee_id:
         fields["assignee"] = {"id": assignee_id}
+    return fields
 
-    payload = {"fields": fields}
-    res = http_post(f"{JIRA_BASE_URL}/rest/api/3/issue", payload)
+async def create_issue_async(task: TaskIn, ctx: RunContext, parent_key: Optional[str]=None) -> str:
+    fields = build_issue_fields(task, ctx, parent_key)
+    res = await http_post_async(ctx.client, ctx.sem, f"{JIRA_BASE_URL}/rest/api/3/issue", {"fields": fields})
     return res["key"]
 
-def run_pipeline(raw_text: str, dry_run: bool=DEFAULT_DRY_RUN) -> List[str]:
+def _bulk_error_body(e: JiraHTTPError) -> Optional[dict]:
+    # Si fallan todos los elementos, /issue/bulk responde 400 con el mismo formato de errores
+    if e.status_code != 400:
+        return None
+    try:
+        body = json.loads(e.text)
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) and isinstance(body.get("errors"), list) else None
+
+async def _create_issues_chunk(ctx: RunContext, fields_chunk: List[dict]) -> List[Optional[str]]:
+    try:
+        res = await http_post_async(ctx.client, ctx.sem, f"{JIRA_BASE_URL}/rest/api/3/issue/bulk", {"issueUpdates": [{"fields": f} for f in fields_chunk]})
+    except JiraHTTPError as e:
+        res = _bulk_error_body(e)
+        if res is None:
+            raise
+    failed = {}
+    for err in res.get("errors", []):
+        detail = err.get("elementErrors", {})
+        failed[err["failedElementNumber"]] = "; ".join(detail.get("errorMessages", []) + [f"{k}: {v}" for k, v in detail.get("errors", {}).items()])
+    # Jira devuelve las issues creadas en el orden del pedido, salteando las fallidas
+    created = iter(res.get("issues", []))
+    keys = []
+    for i, f in enumerate(fields_chunk):
+        if i in failed:
+            print(f"⚠ No se pudo crear {f['summary']!r}: {failed[i] or 'error desconocido'}")
+            keys.append(None)
+        else:
+            it = next(created, None)
+            if it is None:
+                print(f"⚠ Jira no devolvió clave para {f['summary']!r}")
+            keys.append(it["key"] if it else None)
+    return keys
+
+async def create_issues_bulk_async(ctx: RunContext, fields_list: List[dict]) -> List[Optional[str]]:
+    """
+    Crea issues vía /rest/api/3/issue/bulk en tandas de BULK_CHUNK_SIZE.
+    Devuelve las claves en el mismo orden que `fields_list` (None si esa issue falló).
+    """
+    chunks = [fields_list[i:i + BULK_CHUNK_SIZE] for i in range(0, len(fields_list), BULK_CHUNK_SIZE)]
+    results = await asyncio.gather(*[_create_issues_chunk(ctx, c) for c in chunks])
+    return [key for keys in results for key in keys]
+
+def _subtask_as_task(st: SubtaskIn, parent: TaskIn) -> TaskIn:
+    return TaskIn(
+        title=st.title,
+        description=st.description or "",
+        labels=parent.labels,
+        priority=None,
+        due_date=st.due_date,
+        assignee=st.assignee or parent.assignee,
+        subtasks=[]
+    )
+
+async def create_task_with_subtasks_async(i: int, t: TaskIn, ctx: RunContext) -> str:
+    """
+    Crea la tarea principal y después todas sus subtareas en una sola llamada bulk.
+    Cada clave se loguea y se registra en `ctx` apenas Jira la devuelve.
+    """
+    st_tasks = [_subtask_as_task(st, t) for st in t.subtasks] if "subtask" in ctx.ids else []
+    names = [n for n in {t.assignee} | {st.assignee for st in st_tasks} if n and n not in ctx.assignee_cache]
+    for n in names:
+        if n not in ctx.assignee_lookups:
+            ctx.assignee_lookups[n] = asyncio.ensure_future(find_account_id_async(ctx.client, ctx.sem, n))
+    found = await asyncio.gather(*[ctx.assignee_lookups[n] for n in names])
+    ctx.assignee_cache.update(zip(names, found))
+
+    parent_key = await create_issue_async(t, ctx)
+    ctx.created[i] = parent_key
+    print(f"✓ Creada {parent_key}: {t.title}")
+    if "subtask" not in ctx.ids and t.subtasks:
+        print("⚠ Subtareas ignoradas (no se encontró issuetype de Sub-task en tu proyecto).")
+
+    sub_keys = await create_issues_bulk_async(ctx, [
+        build_issue_fields(st_task, ctx, parent_key)
+        for st_task in st_tasks
+    ])
+    for sub_key, st in zip(sub_keys, t.subtasks):
+        if sub_key:
+            ctx.created_subtasks.append(sub_key)
+            print(f"   ↳ Subtask {sub_key} ({parent_key}): {st.title}")
+    return parent_key
+
+async def run_pipeline_async(raw_text: str, dry_run: bool=DEFAULT_DRY_RUN) -> List[str]:
     if dry_run:
         print("→ Modo DRY-RUN (no crea issues)")
     else:
@@ -295,48 +710,54 @@ def run_pipeline(raw_text: str, dry_run: bool=DEFAULT_DRY_RUN) -> List[str]:
         else:
             print("   ⚠ No se encontró la épica. Se crearán tareas sin Epic Link.")
 
-    # 1) Estructurar con LLM
-    print("→ Analizando texto con LLM…")
-    bundle = llm_structurize_tasks(raw_text)
-
-    # 2) Descubrir issue types válidos
+    # 1) Descubrir issue types válidos
     ids = get_issue_type_ids(JIRA_PROJECT_KEY)
     if "task" not in ids or "subtask" not in ids:
         print("⚠ No se encontraron IDs claros de Task/Sub-task. "
               "Se usará el primero disponible para Task y se omitirán subtareas si falta 'subtask'.")
 
-    created_keys = []
-    # 3) Crear issues
-    for t in bundle.tasks:
-        if dry_run:
+    # 2) Estructurar con LLM (en stream) y 3) crear cada tarea apenas llega
+    print("→ Analizando texto con LLM…")
+    if dry_run:
+        async for t in aiter_tasks(raw_text):
             print(f"[DRY] Task: {t.title} | due={t.due_date} | prio={t.priority} | labels={t.labels} | assignee={t.assignee} | epic={epic_name or '—'}")
             for st in t.subtasks:
                 print(f"   [DRY] Subtask: {st.title} | due={st.due_date} | assignee={st.assignee}")
-            continue
-
-        parent_key = create_issue(t, ids, epic_ctx=epic_ctx, epic_field_key=epic_field_key, parent_key=None)
-        print(f"✓ Creada {parent_key}: {t.title}")
-        created_keys.append(parent_key)
-
-        if "subtask" in ids:
-            for st in t.subtasks:
-                st_task = TaskIn(
-                    title=st.title,
-                    description=st.description or "",
-                    labels=t.labels,
-                    priority=None,
-                    due_date=st.due_date,
-                    assignee=st.assignee or t.assignee,
-                    subtasks=[]
-                )
-                sub_key = create_issue(st_task, ids, epic_ctx=None, epic_field_key=None, parent_key=parent_key)
-                print(f"   ↳ Subtask {sub_key}: {st.title}")
-                time.sleep(0.2)
-        else:
-            if t.subtasks:
-                print("⚠ Subtareas ignoradas (no se encontró issuetype de Sub-task en tu proyecto).")
+        return []
+
+    async with new_async_client() as client:
+        ctx = RunContext(
+            ids=ids,
+            priority_map=get_priority_map(),
+            epic_ctx=epic_ctx,
+            epic_field_key=epic_field_key,
+            client=client,
+            # Tope de requests a Jira en vuelo al mismo tiempo
+            sem=asyncio.Semaphore(JIRA_MAX_WORKERS),
+        )
+        pending = []
+        stream_error = None
+        try:
+            async for t in aiter_tasks(raw_text):
+                pending.append(asyncio.create_task(create_task_with_subtasks_async(len(pending), t, ctx)))
+        except Exception as e:
+            stream_error = e
+        # Esperar todo lo ya agendado antes de cerrar el cliente, aunque algo haya fallado
+        results = await asyncio.gather(*pending, return_exceptions=True)
+
+    # Mismo orden que el brief, independientemente del orden de finalización
+    created_keys = [ctx.created[i] for i in sorted(ctx.created)]
+    failure = stream_error or next((r for r in results if isinstance(r, BaseException)), None)
+    if failure is not None:
+        done = created_keys + ctx.created_subtasks
+        print(f"⚠ La corrida falló; issues ya creadas en Jira: {', '.join(done) if done else '(ninguna)'}")
+        raise failure
     return created_keys
 
+def run_pipeline(raw_text: str, dry_run: bool=DEFAULT_DRY_RUN) -> List[str]:
+    # Wrapper sync: la CLI y la UI de Streamlit siguen llamando a run_pipeline igual que antes
+    return asyncio.run(run_pipeline_async(raw_text, dry_run=dry_run))
+
 # =========================
 #  CLI
 # =========================